@@ -1,19 +1,35 @@
 import os
+import io
 import sys
-import math
 import logging
 import time
+import queue
+import itertools
 import threading
 import json
+from dataclasses import dataclass
+from functools import lru_cache
 from datetime import datetime
 
 import pygame
 import pygame.sndarray
 import numpy as np
 import websocket
-from termcolor import colored
 from dotenv import load_dotenv
 
+# Prefer orjson for the per-frame parse; fall back to the stdlib parser if it isn't installed
+try:
+    import orjson
+
+    json_loads = orjson.loads
+
+    def json_dumps(obj):
+        # websocket-client expects str payloads; orjson returns bytes
+        return orjson.dumps(obj).decode()
+except ImportError:
+    json_loads = json.loads
+    json_dumps = json.dumps
+
 # Load .env file (if present) without overriding existing environment variables
 load_dotenv()
 
@@ -27,53 +43,153 @@ except Exception as e:
 # Set up logging
 logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(message)s')
 
-# Environment variables and default settings
-ALPACA_API_KEY = os.getenv('ALPACA_API_KEY', 'YOUR_API_KEY_HERE')
-ALPACA_API_SECRET = os.getenv('ALPACA_API_SECRET', 'YOUR_API_SECRET_HERE')
-# Choose your feed: e.g., 'sip' or 'iex' (see :contentReference[oaicite:1]{index=1})
-ALPACA_FEED = os.getenv('ALPACA_FEED', 'sip')
-ALPACA_STREAM_URL = os.getenv('ALPACA_STREAM_URL', f"wss://stream.data.alpaca.markets/v2/{ALPACA_FEED}")
+@dataclass(frozen=True, slots=True)
+class Config:
+    """
+    Settings taken from the environment (and .env), read once at startup.
+    """
+    api_key: str
+    api_secret: str
+    feed: str
+    stream_url: str
+    # Paths to sound files (customize as needed)
+    buy_sound_path: str
+    sell_sound_path: str
+    above_ask_sound_path: str
+    below_bid_sound_path: str
+    between_bid_ask_sound_path: str
+
+    @classmethod
+    def from_env(cls):
+        env = os.environ
+        # Choose your feed: e.g., 'sip' or 'iex'
+        feed = env.get('ALPACA_FEED', 'sip')
+        return cls(
+            api_key=env.get('ALPACA_API_KEY', 'YOUR_API_KEY_HERE'),
+            api_secret=env.get('ALPACA_API_SECRET', 'YOUR_API_SECRET_HERE'),
+            feed=feed,
+            stream_url=env.get('ALPACA_STREAM_URL', f"wss://stream.data.alpaca.markets/v2/{feed}"),
+            buy_sound_path=env.get('BUY_SOUND_PATH', 'sounds/buy.wav'),
+            sell_sound_path=env.get('SELL_SOUND_PATH', 'sounds/sell.wav'),
+            above_ask_sound_path=env.get('ABOVE_ASK_SOUND_PATH', 'sounds/above_ask.wav'),
+            below_bid_sound_path=env.get('BELOW_BID_SOUND_PATH', 'sounds/below_bid.wav'),
+            between_bid_ask_sound_path=env.get('BETWEEN_BID_ASK_SOUND_PATH', 'sounds/between_bid_ask.wav'),
+        )
+
+CFG = Config.from_env()
 
 DEFAULT_TICKER = "TSLA"
 DEFAULT_THRESHOLD = 90000
 BIG_THRESHOLD = 490000.0
 
-# Paths to sound files (customize as needed)
-BUY_SOUND_PATH = os.getenv('BUY_SOUND_PATH', 'sounds/buy.wav')
-SELL_SOUND_PATH = os.getenv('SELL_SOUND_PATH', 'sounds/sell.wav')
-ABOVE_ASK_SOUND_PATH = os.getenv('ABOVE_ASK_SOUND_PATH', 'sounds/above_ask.wav')
-BELOW_BID_SOUND_PATH = os.getenv('BELOW_BID_SOUND_PATH', 'sounds/below_bid.wav')
-BETWEEN_BID_ASK_SOUND_PATH = os.getenv('BETWEEN_BID_ASK_SOUND_PATH', 'sounds/between_bid_ask.wav')
-
 EPSILON = 1e-3
 
+# Quotes for a ticker arriving within this window of the last logged one are stored but not logged
+QUOTE_LOG_INTERVAL_NS = 500_000
+
+# Max trades waiting for display/audio before new ones are dropped
+OUTPUT_QUEUE_SIZE = 2000
+
+# How often the buffered stdout is flushed to the terminal (seconds)
+STDOUT_FLUSH_INTERVAL = 0.02
+
+# Trade classifications relative to the latest quote, used to index the color/sound tables
+AT_ASK, AT_BID, ABOVE_ASK, BELOW_BID, BETWEEN, BETWEEN_NEAR_ASK, BETWEEN_NEAR_BID = range(7)
+CLASS_COLORS = ('green', 'red', 'yellow', 'magenta', 'white', 'white', 'white')
+
+# Sound event ids, used as indexes into AudioManager.sounds
+(SOUND_BUY, SOUND_BUY_BIG, SOUND_SELL, SOUND_SELL_BIG, SOUND_ABOVE_ASK, SOUND_ABOVE_ASK_BIG,
+ SOUND_BELOW_BID, SOUND_BELOW_BID_BIG, SOUND_BETWEEN, SOUND_BETWEEN_ASK, SOUND_BETWEEN_BID) = range(11)
+
+# ANSI escape sequences for trade output (same codes termcolor emits)
+ANSI_COLORS = {
+    'green': '\x1b[32m',
+    'red': '\x1b[31m',
+    'yellow': '\x1b[33m',
+    'magenta': '\x1b[35m',
+    'white': '\x1b[97m',
+}
+ANSI_BOLD = '\x1b[1m'
+ANSI_ON_GREY = '\x1b[40m'
+ANSI_RESET = '\x1b[0m'
+
 def format_amount(amount: float) -> str:
     """
     Format a numeric amount into a truncated string representation.
+    K/million values are floored to one decimal with integer arithmetic on whole dollars.
     """
-    if amount >= 1_000_000:
-        millions = amount / 1_000_000
-        floored = math.floor(millions * 10) / 10
-        if floored.is_integer():
-            floored = int(floored)
-        return f"{floored} million"
-    elif amount >= 1_000:
-        thousands = amount / 1_000
-        floored = math.floor(thousands * 10) / 10
-        if floored.is_integer():
-            floored = int(floored)
-        return f"{floored}K"
-    else:
-        return f"{amount:,.2f}"
+    if amount >= 1_000:
+        dollars = int(amount)
+        if dollars >= 1_000_000:
+            whole, tenth = divmod(dollars // 100_000, 10)
+            unit = " million"
+        else:
+            whole, tenth = divmod(dollars // 100, 10)
+            unit = "K"
+        return f"{whole}.{tenth}{unit}" if tenth else f"{whole}{unit}"
+    return f"{amount:,.2f}"
+
+@lru_cache(maxsize=4096)
+def _format_amount_bucket(bucket: int) -> str:
+    """
+    format_amount() of bucket * $100. The K/million output is floored to one decimal, so it only
+    depends on the amount floored to $100, and trades cluster on a small set of those buckets.
+    """
+    return format_amount(bucket * 100.0)
+
+def format_amount_cached(amount: float) -> str:
+    """
+    Cached format_amount(). Amounts under $1,000 print to the cent, so they bypass the cache.
+    """
+    if amount >= 1_000:
+        return _format_amount_bucket(int(amount) // 100)
+    return format_amount(amount)
+
+def classify_trade(price: float, ask: float, bid: float) -> int:
+    """
+    Classify a trade price against the quote, returning one of the AT_ASK..BETWEEN_NEAR_BID codes.
+    """
+    if ask - EPSILON < price < ask + EPSILON:
+        return AT_ASK
+    if bid - EPSILON < price < bid + EPSILON:
+        return AT_BID
+    if price > ask + EPSILON:
+        return ABOVE_ASK
+    if price < bid - EPSILON:
+        return BELOW_BID
+    distance_to_ask = abs(price - ask)
+    distance_to_bid = abs(price - bid)
+    if abs(distance_to_ask - distance_to_bid) < 1e-9:
+        return BETWEEN
+    return BETWEEN_NEAR_ASK if distance_to_ask < distance_to_bid else BETWEEN_NEAR_BID
+
+def install_buffered_stdout():
+    """
+    Replace sys.stdout with a 64 KiB block-buffered writer and flush it from a daemon thread
+    every STDOUT_FLUSH_INTERVAL seconds, so a burst of trades costs one write() per tick
+    instead of one per line.
+    """
+    raw = open(sys.stdout.fileno(), 'wb', buffering=64 * 1024, closefd=False)
+    sys.stdout = io.TextIOWrapper(raw, encoding='utf-8', line_buffering=False, write_through=False)
+
+    def flush_loop():
+        while True:
+            time.sleep(STDOUT_FLUSH_INTERVAL)
+            try:
+                sys.stdout.flush()
+            except Exception as e:
+                logging.error(f"Error flushing stdout: {e}")
+
+    threading.Thread(target=flush_loop, name="stdout-flusher", daemon=True).start()
 
 class AudioManager:
     def __init__(self):
         try:
-            self.buy_sound = pygame.mixer.Sound(BUY_SOUND_PATH)
-            self.sell_sound = pygame.mixer.Sound(SELL_SOUND_PATH)
-            self.above_ask_sound = pygame.mixer.Sound(ABOVE_ASK_SOUND_PATH)
-            self.below_bid_sound = pygame.mixer.Sound(BELOW_BID_SOUND_PATH)
-            self.between_bid_ask_sound = pygame.mixer.Sound(BETWEEN_BID_ASK_SOUND_PATH)
+            self.buy_sound = pygame.mixer.Sound(CFG.buy_sound_path)
+            self.sell_sound = pygame.mixer.Sound(CFG.sell_sound_path)
+            self.above_ask_sound = pygame.mixer.Sound(CFG.above_ask_sound_path)
+            self.below_bid_sound = pygame.mixer.Sound(CFG.below_bid_sound_path)
+            self.between_bid_ask_sound = pygame.mixer.Sound(CFG.between_bid_ask_sound_path)
         except Exception as e:
             logging.error(f"Error loading sound files: {e}")
             sys.exit(1)
@@ -86,71 +202,55 @@ class AudioManager:
         # Closer to bid or ask sounds
         self.between_bid_ask_sound_ask = self.pitch_shift_sound(self.between_bid_ask_sound, pitch_factor=1.5)
         self.between_bid_ask_sound_bid = self.pitch_shift_sound(self.between_bid_ask_sound, pitch_factor=0.8)
-    
+
+        # Sounds indexed by the SOUND_* event ids
+        self.sounds = [
+            self.buy_sound, self.buy_sound_big,
+            self.sell_sound, self.sell_sound_big,
+            self.above_ask_sound, self.above_ask_sound_big,
+            self.below_bid_sound, self.below_bid_sound_big,
+            self.between_bid_ask_sound, self.between_bid_ask_sound_ask, self.between_bid_ask_sound_bid,
+        ]
+        # Rotate through the mixer's channels ourselves instead of letting Sound.play() search for a free one
+        self._channels = itertools.cycle(
+            [pygame.mixer.Channel(i) for i in range(pygame.mixer.get_num_channels())]
+        )
+
     @staticmethod
     def pitch_shift_sound(original_sound: pygame.mixer.Sound, pitch_factor: float) -> pygame.mixer.Sound:
         if not original_sound:
             return None
-        sound_array = pygame.sndarray.array(original_sound)
+        # A zero-copy view of the Sound's buffer; the float32 conversion below is the only copy
+        sound_array = pygame.sndarray.samples(original_sound)
         num_samples = sound_array.shape[0]  # works for mono and multi-channel alike
-        new_indices = np.arange(0, num_samples, 1.0 / pitch_factor)
-        new_indices = np.round(new_indices).astype(np.int32)
-        new_indices = new_indices[new_indices < num_samples]
-        if len(new_indices) == 0:
+        if num_samples < 2:
             logging.warning(f"Pitch shift resulted in empty array (pitch_factor={pitch_factor}). Returning original sound.")
             return original_sound
-        if sound_array.ndim == 1:
-            pitched_array = sound_array[new_indices]
-        else:
-            pitched_array = sound_array[new_indices, :]
+        # Linear interpolation: output sample i sits at source position i / pitch_factor and is
+        # blended from the two neighbouring samples, instead of snapping to the nearest one.
+        num_out = int((num_samples - 1) * pitch_factor) + 1
+        positions = np.arange(num_out, dtype=np.float32) / np.float32(pitch_factor)
+        left = positions.astype(np.intp)
+        np.minimum(left, num_samples - 2, out=left)
+        frac = positions - left
+        if sound_array.ndim == 2:
+            frac = frac[:, None]
+        samples = sound_array.astype(np.float32)
+        a = samples.take(left, axis=0)
+        b = samples.take(left + 1, axis=0)
+        pitched_array = np.rint(a + frac * (b - a))
         if pitched_array.size == 0:
             logging.warning(f"Pitch shift array is empty after indexing (pitch_factor={pitch_factor}). Returning original sound.")
             return original_sound
+        # Hand pygame one C-contiguous buffer of the mixer's sample type so it doesn't copy again
+        pitched_array = np.ascontiguousarray(pitched_array, dtype=sound_array.dtype)
         return pygame.sndarray.make_sound(pitched_array)
 
-    def play_above_ask_sound(self):
-        if self.above_ask_sound is not None:
-            self.above_ask_sound.play()
-
-    def play_above_ask_sound_big(self):
-        if self.above_ask_sound_big is not None:
-            self.above_ask_sound_big.play()
-
-    def play_buy_sound(self):
-        if self.buy_sound is not None:
-            self.buy_sound.play()
-
-    def play_buy_sound_big(self):
-        if self.buy_sound_big is not None:
-            self.buy_sound_big.play()
-
-    def play_between_bid_ask_sound_ask(self):
-        if self.between_bid_ask_sound_ask is not None:
-            self.between_bid_ask_sound_ask.play()
-
-    def play_between_bid_ask_sound(self):
-        if self.between_bid_ask_sound is not None:
-            self.between_bid_ask_sound.play()
-
-    def play_between_bid_ask_sound_bid(self):
-        if self.between_bid_ask_sound_bid is not None:
-            self.between_bid_ask_sound_bid.play()
-
-    def play_sell_sound(self):
-        if self.sell_sound is not None:
-            self.sell_sound.play()
-
-    def play_sell_sound_big(self):
-        if self.sell_sound_big is not None:
-            self.sell_sound_big.play()
-
-    def play_below_bid_sound(self):
-        if self.below_bid_sound is not None:
-            self.below_bid_sound.play()
-
-    def play_below_bid_sound_big(self):
-        if self.below_bid_sound_big is not None:
-            self.below_bid_sound_big.play()
+    def play(self, ev_id):
+        """
+        Play the sound for a SOUND_* event id on the next mixer channel.
+        """
+        next(self._channels).play(self.sounds[ev_id])
 
 class TradesProcessor:
     def __init__(self, api_key, api_secret, trade_threshold, big_threshold, ticker):
@@ -160,138 +260,168 @@ class TradesProcessor:
         self.big_threshold = big_threshold
         self.ticker = ticker
         self.audio_manager = AudioManager()
+        # (ask, bid) per ticker. Only the websocket-client callback thread reads and writes it,
+        # and replacing a tuple under a dict key is atomic, so no lock is needed.
         self.latest_quotes = {}
-        self._lock = threading.Lock()
         self.ws = None
+        # Log levels are fixed at startup, so check them once instead of formatting messages that get dropped
+        self._log_info_on = logging.getLogger().isEnabledFor(logging.INFO)
+        self._log_debug_on = logging.getLogger().isEnabledFor(logging.DEBUG)
+        # When each ticker's quote was last logged
+        self._last_quote_ns = {}
+        # One-entry cache for convert_timestamp: (whole-second prefix, formatted string)
+        self._last_ts_key = None
+        self._last_ts_str = None
+        # Stream message handlers keyed by Alpaca's "T" (message type) field
+        self._dispatch = {"t": self.handle_trade_message, "q": self.handle_quote_message}
+        # Display and audio run on their own thread so the websocket thread never blocks on them
+        self._out_queue = queue.Queue(maxsize=OUTPUT_QUEUE_SIZE)
+        self._dropped_trades = 0
+        threading.Thread(target=self._output_loop, name="trade-output", daemon=True).start()
+
+        # (normal, big) sound event id per trade classification
+        sound_table = [
+            (SOUND_BUY, SOUND_BUY_BIG),
+            (SOUND_SELL, SOUND_SELL_BIG),
+            (SOUND_ABOVE_ASK, SOUND_ABOVE_ASK_BIG),
+            (SOUND_BELOW_BID, SOUND_BELOW_BID_BIG),
+            (SOUND_BETWEEN, SOUND_BETWEEN),
+            (SOUND_BETWEEN_ASK, SOUND_BETWEEN_ASK),
+            (SOUND_BETWEEN_BID, SOUND_BETWEEN_BID),
+        ]
+        # Pre-build the ANSI (prefix, suffix) pair for every (color, is_big_trade) combination.
+        # Like termcolor, emit plain text when stdout isn't a terminal or NO_COLOR is set.
+        use_color = sys.stdout.isatty() and 'NO_COLOR' not in os.environ
+        ansi = {}
+        for color, fg in ANSI_COLORS.items():
+            for big in (False, True):
+                if use_color:
+                    prefix = (ANSI_BOLD + ANSI_ON_GREY if big else '') + fg
+                    ansi[(color, big)] = (prefix, ANSI_RESET + "\n")
+                else:
+                    ansi[(color, big)] = ('', "\n")
+        # Everything the trade path needs, resolved once:
+        # self._trade_output[code][is_big_trade] -> (sound event id, ANSI prefix, ANSI suffix)
+        self._trade_output = [
+            [(sound_ids[big],) + ansi[(CLASS_COLORS[code], big)] for big in (False, True)]
+            for code, sound_ids in enumerate(sound_table)
+        ]
 
     def convert_timestamp(self, ts_str):
         """
         Convert an RFC‑3339 timestamp string (with nanosecond precision) to a human‑readable format.
-        Limits fractional seconds to 6 digits.
+        Only the whole-second part is used, and the last result is cached since consecutive
+        messages mostly fall within the same second.
         """
         try:
-            if '.' in ts_str:
-                base, frac = ts_str.split('.')
-                frac = frac.rstrip("Z")[:6]
-                ts_str = base + '.' + frac + '+00:00'
-            dt_obj = datetime.fromisoformat(ts_str)
-            return dt_obj.strftime('%Y-%m-%d %H:%M:%S')
+            seconds_part = ts_str[:19]
+            if seconds_part == self._last_ts_key:
+                return self._last_ts_str
+            dt_obj = datetime(
+                int(seconds_part[0:4]), int(seconds_part[5:7]), int(seconds_part[8:10]),
+                int(seconds_part[11:13]), int(seconds_part[14:16]), int(seconds_part[17:19])
+            )
+            self._last_ts_str = dt_obj.strftime('%Y-%m-%d %H:%M:%S')
+            self._last_ts_key = seconds_part
+            return self._last_ts_str
         except Exception as e:
             logging.error(f"Timestamp conversion error: {e}")
             return "Invalid timestamp"
 
     def handle_quote_message(self, quote):
         try:
-            ticker = quote.get("S")
-            ask = quote.get("ap")
-            bid = quote.get("bp")
-            with self._lock:
-                self.latest_quotes[ticker] = {'ask': ask, 'bid': bid}
-            formatted_time = self.convert_timestamp(quote.get("t"))
+            try:
+                ticker = quote["S"]
+                ask = quote["ap"]
+                bid = quote["bp"]
+                ts = quote["t"]
+            except KeyError:
+                return
+            self.latest_quotes[ticker] = (ask, bid)
+            # Only the latest quote matters for classification; the rest is logging work
+            if not self._log_info_on:
+                return
+            now_ns = time.monotonic_ns()
+            if now_ns - self._last_quote_ns.get(ticker, 0) < QUOTE_LOG_INTERVAL_NS:
+                return
+            self._last_quote_ns[ticker] = now_ns
+            formatted_time = self.convert_timestamp(ts)
             logging.info(f"Quote {ticker} at {formatted_time}: Ask={ask}, Bid={bid}")
         except Exception as e:
             logging.error(f"Error handling quote message: {e}")
 
     def handle_trade_message(self, trade):
         try:
-            ticker = trade.get("S")
-            price = trade.get("p")
-            volume = trade.get("s")
+            # Alpaca always sends these fields; skip malformed messages
+            try:
+                ticker = trade["S"]
+                price = trade["p"]
+                volume = trade["s"]
+                ts = trade["t"]
+            except KeyError:
+                return
             amount = price * volume
-            timestamp_str = self.convert_timestamp(trade.get("t"))
 
             # Skip small trades
             if amount < self.trade_threshold:
-                logging.debug(f"Trade {ticker} at {timestamp_str} ignored (Amount: ${amount:.2f})")
+                if self._log_debug_on:
+                    logging.debug(f"Trade {ticker} at {self.convert_timestamp(ts)} ignored (Amount: ${amount:.2f})")
                 return
 
-            with self._lock:
-                quote = self.latest_quotes.get(ticker, {})
-                ask = quote.get('ask')
-                bid = quote.get('bid')
-
-            is_big_trade = (amount >= self.big_threshold)
-
-            if ask is None or bid is None:
-                color = 'white'
-                self.audio_manager.play_between_bid_ask_sound()
-                formatted_amount = format_amount(amount)
-                price_str = f"{price:,.2f}"
-                on_color = 'on_grey' if is_big_trade else None
-                attrs = ['bold'] if is_big_trade else []
-                print(colored(
-                    f"Price: {price_str} | Amount: ${formatted_amount} | Time: {timestamp_str} | Ticker: {ticker}",
-                    color=color,
-                    on_color=on_color,
-                    attrs=attrs
-                ))
-                return
+            timestamp_str = self.convert_timestamp(ts)
 
-            if abs(price - ask) < EPSILON:
-                color = 'green'
-                if is_big_trade:
-                    self.audio_manager.play_buy_sound_big()
-                else:
-                    self.audio_manager.play_buy_sound()
-            elif abs(price - bid) < EPSILON:
-                color = 'red'
-                if is_big_trade:
-                    self.audio_manager.play_sell_sound_big()
-                else:
-                    self.audio_manager.play_sell_sound()
-            elif price > (ask + EPSILON):
-                color = 'yellow'
-                if is_big_trade:
-                    self.audio_manager.play_above_ask_sound_big()
-                else:
-                    self.audio_manager.play_above_ask_sound()
-            elif price < (bid - EPSILON):
-                color = 'magenta'
-                if is_big_trade:
-                    self.audio_manager.play_below_bid_sound_big()
-                else:
-                    self.audio_manager.play_below_bid_sound()
+            # Without a quote, treat the trade as "between bid and ask"
+            quote = self.latest_quotes.get(ticker)
+            if quote is None:
+                code = BETWEEN
             else:
-                distance_to_ask = abs(price - ask)
-                distance_to_bid = abs(price - bid)
-                color = 'white'
-                if abs(distance_to_ask - distance_to_bid) < 1e-9:
-                    self.audio_manager.play_between_bid_ask_sound()
-                else:
-                    if distance_to_ask < distance_to_bid:
-                        self.audio_manager.play_between_bid_ask_sound_ask()
-                    else:
-                        self.audio_manager.play_between_bid_ask_sound_bid()
-
-            formatted_amount = format_amount(amount)
-            price_str = f"{price:,.2f}"
-            on_color = 'on_grey' if is_big_trade else None
-            attrs = ['bold'] if is_big_trade else []
-            print(colored(
-                f"Price: {price_str} | Amount: ${formatted_amount} | Time: {timestamp_str} | Ticker: {ticker}",
-                color=color,
-                on_color=on_color,
-                attrs=attrs
-            ))
+                ask, bid = quote
+                code = BETWEEN if ask is None or bid is None else classify_trade(price, ask, bid)
+
+            ev_id, prefix, suffix = self._trade_output[code][amount >= self.big_threshold]
+            line = f"{prefix}Price: {price:,.2f} | Amount: ${format_amount_cached(amount)} | Time: {timestamp_str} | Ticker: {ticker}{suffix}"
+            try:
+                self._out_queue.put_nowait((ev_id, line))
+            except queue.Full:
+                self._dropped_trades += 1
+                if self._dropped_trades % 100 == 1:
+                    logging.warning(f"Output queue full; dropped {self._dropped_trades} trades so far")
         except Exception as e:
             logging.error(f"Error handling trade message: {e}")
 
+    def _output_loop(self):
+        """
+        Consume (sound event id, line) items queued by handle_trade_message: play the sound and print the line.
+        """
+        out_queue = self._out_queue
+        play = self.audio_manager.play
+        # The line is plain ASCII plus ANSI escapes, so write bytes straight to the buffered
+        # binary stream (flushed by install_buffered_stdout's timer) and skip the text layer.
+        write = sys.stdout.buffer.write
+        while True:
+            ev_id, line = out_queue.get()
+            try:
+                play(ev_id)
+                write(line.encode('ascii', 'replace'))
+            except Exception as e:
+                logging.error(f"Error outputting trade: {e}")
+
     def handle_message(self, message):
         """
         Processes a received message string (which may contain a JSON array of messages).
         """
         try:
-            data = json.loads(message)
-            if isinstance(data, dict):
-                data = [data]
+            data = json_loads(message)
+            # Alpaca almost always sends a list; a bare object is the exception
+            if data.__class__ is not list:
+                data = (data,)
+            dispatch = self._dispatch
             for msg in data:
-                if "T" not in msg:
-                    continue
-                if msg["T"] == "t":
-                    self.handle_trade_message(msg)
-                elif msg["T"] == "q":
-                    self.handle_quote_message(msg)
-                else:
+                msg_type = msg.get("T")
+                handler = dispatch.get(msg_type)
+                if handler is not None:
+                    handler(msg)
+                elif msg_type is not None:
                     logging.info(f"Received message: {msg}")
         except Exception as e:
             logging.error(f"Error processing message: {e}")
@@ -304,16 +434,21 @@ class TradesProcessor:
             "key": self.api_key,
             "secret": self.api_secret
         }
-        ws.send(json.dumps(auth_msg))
+        ws.send(json_dumps(auth_msg))
         # Subscribe to trades and quotes for the specified ticker
         subscribe_msg = {
             "action": "subscribe",
             "trades": [self.ticker],
             "quotes": [self.ticker]
         }
-        ws.send(json.dumps(subscribe_msg))
+        ws.send(json_dumps(subscribe_msg))
 
     def on_message(self, ws, message):
+        """
+        'message' is the frame's raw UTF-8 bytes: with UTF-8 validation skipped in run(),
+        websocket-client doesn't decode text frames. It is passed to json_loads as-is, which
+        accepts bytes, so it is never decoded to str.
+        """
         self.handle_message(message)
 
     def on_error(self, ws, error):
@@ -329,21 +464,24 @@ class TradesProcessor:
         max_retries = 3
         delay = 10
         remaining_retries = max_retries
+        stream_url = CFG.stream_url
 
         while True:
             try:
                 self.ws = websocket.WebSocketApp(
-                    ALPACA_STREAM_URL,
+                    stream_url,
                     on_open=self.on_open,
                     on_message=self.on_message,
                     on_error=self.on_error,
                     on_close=self.on_close
                 )
-                self.ws.run_forever()
+                # Alpaca frames are server-generated JSON, so skip websocket-client's UTF-8 re-validation
+                self.ws.run_forever(skip_utf8_validation=True, ping_interval=20, ping_timeout=10)
                 logging.info("WebSocket connection ended gracefully.")
                 remaining_retries = max_retries
             except KeyboardInterrupt:
                 logging.info("KeyboardInterrupt detected. Shutting down gracefully.")
+                sys.stdout.flush()
                 break
             except Exception as e:
                 remaining_retries -= 1
@@ -399,7 +537,8 @@ def main():
             print("Error: big_threshold must be a numeric value.")
             sys.exit(1)
 
-    processor = TradesProcessor(ALPACA_API_KEY, ALPACA_API_SECRET, threshold, big_threshold, ticker)
+    install_buffered_stdout()
+    processor = TradesProcessor(CFG.api_key, CFG.api_secret, threshold, big_threshold, ticker)
     processor.run()
 
 if __name__ == '__main__':
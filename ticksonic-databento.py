@@ -4,21 +4,31 @@
 
 import os
 import sys
-import math
+import hashlib
 import logging
 import time
+import queue
 import threading
 from datetime import datetime, timedelta
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
 
 import pygame
 import pygame.sndarray
 import numpy as np
 import databento as db
-from termcolor import colored
+from databento_dbn import UNDEF_PRICE
 
 from dotenv import load_dotenv
 from zoneinfo import ZoneInfo
 
+# Compile the historical classification kernel with numba when it is installed;
+# otherwise classify_trades falls back to NumPy
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+
 # Load .env file if it exists
 load_dotenv()
 
@@ -46,96 +56,328 @@ BETWEEN_BID_ASK_SOUND_PATH = os.getenv('BETWEEN_BID_ASK_SOUND_PATH', 'sounds/bet
 
 BIG_THRESHOLD = 490000.0
 EPSILON = 1e-3  # in dollars
+# Databento prices are fixed-point integers in units of 1e-9 dollars
+PRICE_SCALE = 1e-9
+# EPSILON in those fixed-point units
+EPSILON_FIXED = 1_000_000
+
+# Time zones used for parsing input times and displaying trade times
+_UTC = ZoneInfo("UTC")
+_ET = ZoneInfo("America/New_York")
+
+# Trade classifications relative to the latest quote, used to index TradesProcessor._dispatch
+AT_ASK, AT_BID, ABOVE_ASK, BELOW_BID, BETWEEN_NEAR_ASK, BETWEEN_NEAR_BID, BETWEEN = range(7)
+
+# Sound event codes, used as indexes into AudioManager.sounds
+(SOUND_BUY, SOUND_BUY_BIG, SOUND_SELL, SOUND_SELL_BIG, SOUND_ABOVE_ASK, SOUND_ABOVE_ASK_BIG,
+ SOUND_BELOW_BID, SOUND_BELOW_BID_BIG, SOUND_BETWEEN, SOUND_BETWEEN_ASK, SOUND_BETWEEN_BID) = range(11)
+
+# ANSI escape sequences for trade output (same codes termcolor emits)
+ANSI_COLORS = {
+    'green': b'\x1b[32m',
+    'red': b'\x1b[31m',
+    'yellow': b'\x1b[33m',
+    'magenta': b'\x1b[35m',
+    'white': b'\x1b[97m',
+}
+ANSI_BOLD = b'\x1b[1m'
+ANSI_RESET = b'\x1b[0m'
+
+# (sound file, pitch factor or None for the original) for each SOUND_* event code
+SOUND_SPECS = [
+    (BUY_SOUND_PATH, None), (BUY_SOUND_PATH, 1.5),
+    (SELL_SOUND_PATH, None), (SELL_SOUND_PATH, 0.8),
+    (ABOVE_ASK_SOUND_PATH, None), (ABOVE_ASK_SOUND_PATH, 1.5),
+    (BELOW_BID_SOUND_PATH, None), (BELOW_BID_SOUND_PATH, 0.8),
+    (BETWEEN_BID_ASK_SOUND_PATH, None), (BETWEEN_BID_ASK_SOUND_PATH, 1.5), (BETWEEN_BID_ASK_SOUND_PATH, 0.8),
+]
+
+# Capacity of the sound event ring buffer (power of two)
+SOUND_RING_SIZE = 1024
+
+# Minimum time between two plays of the same non-big sound (seconds); repeats inside it are skipped
+SOUND_MIN_INTERVAL = 0.02
+# Big-trade sounds are never skipped
+SOUND_ALWAYS_PLAY = (SOUND_BUY_BIG, SOUND_SELL_BIG, SOUND_ABOVE_ASK_BIG, SOUND_BELOW_BID_BIG)
+
+# Max trade lines waiting for the stdout writer thread before new ones are dropped
+OUTPUT_QUEUE_SIZE = 2000
+
+# Pitch-shifted sound samples are cached here between runs
+SOUND_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'ticksonic')
+# Identifies the pitch-shift algorithm in the cache key; change it whenever
+# pitch_shift_sound's output changes so stale cached samples are not reused
+SOUND_CACHE_RESAMPLER = "linear-interp-v1"
 
 def format_amount(amount: float) -> str:
-    if amount >= 1_000_000:
-        millions = amount / 1_000_000
-        floored = math.floor(millions * 10) / 10
-        if floored.is_integer():
-            floored = int(floored)
-        return f"{floored} million"
-    elif amount >= 1_000:
-        thousands = amount / 1_000
-        floored = math.floor(thousands * 10) / 10
-        if floored.is_integer():
-            floored = int(floored)
-        return f"{floored}K"
-    else:
-        return f"{amount:,.2f}"
+    """
+    Format a dollar amount as "1.2 million", "345.6K" or "999.99", flooring to one decimal.
+    Uses integer arithmetic on whole dollars instead of float floor/is_integer round trips.
+    """
+    if amount >= 1_000:
+        dollars = int(amount)
+        if dollars >= 1_000_000:
+            whole, tenth = divmod(dollars // 100_000, 10)
+            unit = " million"
+        else:
+            whole, tenth = divmod(dollars // 100, 10)
+            unit = "K"
+        return f"{whole}.{tenth}{unit}" if tenth else f"{whole}{unit}"
+    return f"{amount:,.2f}"
+
+def classify_trade(price, ask, bid, epsilon=EPSILON) -> int:
+    """
+    Classify one trade price against the quote, returning one of the AT_ASK..BETWEEN codes.
+    Works on dollar floats or on raw fixed-point ints (with epsilon=EPSILON_FIXED).
+    """
+    if ask - epsilon < price < ask + epsilon:
+        return AT_ASK
+    if bid - epsilon < price < bid + epsilon:
+        return AT_BID
+    if price > ask + epsilon:
+        return ABOVE_ASK
+    if price < bid - epsilon:
+        return BELOW_BID
+    distance_to_ask = abs(price - ask)
+    distance_to_bid = abs(price - bid)
+    if abs(distance_to_ask - distance_to_bid) < 1e-9:
+        return BETWEEN
+    return BETWEEN_NEAR_ASK if distance_to_ask < distance_to_bid else BETWEEN_NEAR_BID
+
+def _classify_trades_numpy(price: np.ndarray, ask: np.ndarray, bid: np.ndarray) -> np.ndarray:
+    diff_ask = price - ask
+    diff_bid = price - bid
+    distance_to_ask = np.abs(diff_ask)
+    distance_to_bid = np.abs(diff_bid)
+    return np.select(
+        [
+            np.isnan(ask) | np.isnan(bid),
+            distance_to_ask < EPSILON,
+            distance_to_bid < EPSILON,
+            diff_ask > EPSILON,
+            diff_bid < -EPSILON,
+            np.abs(distance_to_ask - distance_to_bid) < 1e-9,
+            distance_to_ask < distance_to_bid,
+        ],
+        [BETWEEN, AT_ASK, AT_BID, ABOVE_ASK, BELOW_BID, BETWEEN, BETWEEN_NEAR_ASK],
+        default=BETWEEN_NEAR_BID,
+    ).astype(np.int8)
+
+if njit is not None:
+    # The explicit signature compiles the kernel when the module loads (or loads it from the
+    # on-disk cache), so the first historical batch doesn't pay JIT latency.
+    # No fastmath: it would let LLVM assume the NaN (missing quote) checks are always false.
+    @njit("void(float64[::1], float64[::1], float64[::1], int8[::1])", parallel=True, cache=True)
+    def _classify_trades_kernel(price, ask, bid, out):
+        for i in prange(price.shape[0]):
+            p = price[i]
+            a = ask[i]
+            b = bid[i]
+            if np.isnan(a) or np.isnan(b):
+                out[i] = BETWEEN
+            elif abs(p - a) < EPSILON:
+                out[i] = AT_ASK
+            elif abs(p - b) < EPSILON:
+                out[i] = AT_BID
+            elif p - a > EPSILON:
+                out[i] = ABOVE_ASK
+            elif p - b < -EPSILON:
+                out[i] = BELOW_BID
+            else:
+                distance_to_ask = abs(p - a)
+                distance_to_bid = abs(p - b)
+                if abs(distance_to_ask - distance_to_bid) < 1e-9:
+                    out[i] = BETWEEN
+                elif distance_to_ask < distance_to_bid:
+                    out[i] = BETWEEN_NEAR_ASK
+                else:
+                    out[i] = BETWEEN_NEAR_BID
+else:
+    _classify_trades_kernel = None
+
+def classify_trades(price: np.ndarray, ask: np.ndarray, bid: np.ndarray) -> np.ndarray:
+    """
+    Vectorized trade classification (AT_ASK..BETWEEN codes as int8) for arrays of trade prices
+    and the quotes in effect. A NaN ask or bid (no quote) classifies as BETWEEN.
+    Runs as a single parallel numba loop when numba is available, else as a NumPy np.select.
+    """
+    if _classify_trades_kernel is None:
+        return _classify_trades_numpy(price, ask, bid)
+    out = np.empty(price.shape[0], dtype=np.int8)
+    _classify_trades_kernel(np.ascontiguousarray(price, dtype=np.float64),
+                            np.ascontiguousarray(ask, dtype=np.float64),
+                            np.ascontiguousarray(bid, dtype=np.float64), out)
+    return out
+
+def sound_cache_file(path: str, pitch_factor: float) -> str:
+    """
+    Cache file for the pitch-shifted samples of 'path'. The key hashes the file's contents (so
+    touched or copied files still hit, and edited ones miss) plus the pitch factor, the mixer
+    format, since pygame.sndarray returns samples in the mixer's rate/size/channel layout, and
+    SOUND_CACHE_RESAMPLER, so a changed resampler doesn't reuse the old one's output.
+    """
+    with open(path, 'rb') as f:
+        key = hashlib.sha1(f.read())
+    key.update(f"|{pitch_factor}|{pygame.mixer.get_init()}|{SOUND_CACHE_RESAMPLER}".encode())
+    return os.path.join(SOUND_CACHE_DIR, key.hexdigest() + ".npy")
 
 class AudioManager:
     def __init__(self):
         try:
-            self.buy_sound = pygame.mixer.Sound(BUY_SOUND_PATH)
-            self.sell_sound = pygame.mixer.Sound(SELL_SOUND_PATH)
-            self.above_ask_sound = pygame.mixer.Sound(ABOVE_ASK_SOUND_PATH)
-            self.below_bid_sound = pygame.mixer.Sound(BELOW_BID_SOUND_PATH)
-            self.between_bid_ask_sound = pygame.mixer.Sound(BETWEEN_BID_ASK_SOUND_PATH)
+            originals = {path: pygame.mixer.Sound(path) for path in dict.fromkeys(path for path, _ in SOUND_SPECS)}
         except Exception as e:
             logging.error(f"Error loading sound files: {e}")
             sys.exit(1)
-        # Create pitch-shifted versions for "big" trades
-        self.above_ask_sound_big = self.pitch_shift_sound(self.above_ask_sound, 1.5)
-        self.buy_sound_big = self.pitch_shift_sound(self.buy_sound, 1.5)
-        self.sell_sound_big = self.pitch_shift_sound(self.sell_sound, 0.8)
-        self.below_bid_sound_big = self.pitch_shift_sound(self.below_bid_sound, 0.8)
-        self.between_bid_ask_sound_ask = self.pitch_shift_sound(self.between_bid_ask_sound, 1.5)
-        self.between_bid_ask_sound_bid = self.pitch_shift_sound(self.between_bid_ask_sound, 0.8)
-        
+        # Sounds indexed by the SOUND_* event codes; pitch-shifted variants mark "big" trades
+        # and near-ask/near-bid trades
+        self.sounds = [
+            originals[path] if pitch_factor is None else self.pitch_shift_sound(originals[path], pitch_factor, path)
+            for path, pitch_factor in SOUND_SPECS
+        ]
+        # Give every sound its own mixer channel, so a play never has to search for a free one.
+        # A repeat of a sound restarts it on its channel instead of stacking up copies.
+        if pygame.mixer.get_num_channels() < len(self.sounds):
+            pygame.mixer.set_num_channels(len(self.sounds))
+        self.channels = [pygame.mixer.Channel(i) for i in range(len(self.sounds))]
+        # Zero-argument play callables by event code, so dispatch is one index and one call
+        self.play_fns = [partial(channel.play, sound) for channel, sound in zip(self.channels, self.sounds)]
+
     @staticmethod
-    def pitch_shift_sound(original_sound: pygame.mixer.Sound, pitch_factor: float) -> pygame.mixer.Sound:
+    def pitch_shift_sound(original_sound: pygame.mixer.Sound, pitch_factor: float, source_path: str = None) -> pygame.mixer.Sound:
+        """
+        Resample 'original_sound' by 'pitch_factor'. If 'source_path' is given, the result is
+        loaded from / saved to SOUND_CACHE_DIR so the resample only runs on the first start.
+        """
         if not original_sound:
             return None
-        sound_array = pygame.sndarray.array(original_sound)
+        cache_file = None
+        if source_path:
+            try:
+                cache_file = sound_cache_file(source_path, pitch_factor)
+                if os.path.exists(cache_file):
+                    return pygame.sndarray.make_sound(np.load(cache_file))
+            except Exception as e:
+                logging.warning(f"Could not use sound cache for {source_path}: {e}")
+        # A zero-copy view of the Sound's buffer; the float32 conversion below is the only copy
+        sound_array = pygame.sndarray.samples(original_sound)
         num_samples = sound_array.shape[0]
-        new_indices = np.arange(0, num_samples, 1.0 / pitch_factor)
-        new_indices = np.round(new_indices).astype(int)
-        new_indices = new_indices[new_indices < num_samples]
-        if len(new_indices) == 0:
+        if num_samples < 2:
             logging.warning(f"Pitch shift resulted in empty array (pitch_factor={pitch_factor}).")
             return original_sound
-        pitched_array = sound_array[new_indices] if sound_array.ndim == 1 else sound_array[new_indices, :]
+        # Linear interpolation: output sample i sits at source position i / pitch_factor and is
+        # blended from the two neighbouring samples (a fused multiply-add NumPy vectorizes).
+        out_len = int((num_samples - 1) * pitch_factor) + 1
+        positions = np.arange(out_len, dtype=np.float32) / np.float32(pitch_factor)
+        left = positions.astype(np.intp)
+        np.minimum(left, num_samples - 2, out=left)
+        frac = positions - left
+        if sound_array.ndim == 2:
+            frac = frac[:, None]
+        samples = sound_array.astype(np.float32)
+        a = samples.take(left, axis=0)
+        b = samples.take(left + 1, axis=0)
+        pitched_array = np.rint(a + frac * (b - a)).astype(sound_array.dtype)
         if pitched_array.size == 0:
             logging.warning(f"Pitch shift array is empty after indexing (pitch_factor={pitch_factor}).")
             return original_sound
+        if cache_file:
+            try:
+                os.makedirs(SOUND_CACHE_DIR, exist_ok=True)
+                tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+                with open(tmp_file, "wb") as f:
+                    np.save(f, pitched_array)
+                os.replace(tmp_file, cache_file)
+            except OSError as e:
+                logging.warning(f"Could not write sound cache {cache_file}: {e}")
         return pygame.sndarray.make_sound(pitched_array)
 
-    # Define methods to play sounds
-    def play_buy_sound(self):
-        self.buy_sound.play()
-    def play_sell_sound(self):
-        self.sell_sound.play()
-    def play_above_ask_sound(self):
-        self.above_ask_sound.play()
-    def play_below_bid_sound(self):
-        self.below_bid_sound.play()
-    def play_buy_sound_big(self):
-        self.buy_sound_big.play()
-    def play_sell_sound_big(self):
-        self.sell_sound_big.play()
-    def play_above_ask_sound_big(self):
-        self.above_ask_sound_big.play()
-    def play_below_bid_sound_big(self):
-        self.below_bid_sound_big.play()
-    def play_between_bid_ask_sound_ask(self):
-        self.between_bid_ask_sound_ask.play()
-    def play_between_bid_ask_sound_bid(self):
-        self.between_bid_ask_sound_bid.play()
-    def play_between_bid_ask_sound(self):
-        self.between_bid_ask_sound.play()
+class SoundEventRing:
+    """
+    Bounded single-producer/single-consumer queue of sound event codes.
+    Only the producer advances 'head' and only the consumer advances 'tail', so no lock is needed.
+    When full, new events are dropped and counted in 'dropped'.
+    """
+    def __init__(self, capacity=SOUND_RING_SIZE):
+        self._buf = [0] * capacity
+        self._mask = capacity - 1
+        self.head = 0
+        self.tail = 0
+        self.dropped = 0
+
+    def push(self, code):
+        head = self.head
+        if head - self.tail > self._mask:
+            self.dropped += 1
+            return False
+        self._buf[head & self._mask] = code
+        self.head = head + 1
+        return True
+
+    def pop(self):
+        tail = self.tail
+        if tail == self.head:
+            return None
+        code = self._buf[tail & self._mask]
+        self.tail = tail + 1
+        return code
 
 class TradesProcessor:
     def __init__(self, api_key, trade_threshold, big_threshold, ticker, mode="live", start_time=None, end_time=None):
         self.api_key = api_key
         self.trade_threshold = trade_threshold
-        self.big_threshold = big_threshold        
+        self.big_threshold = big_threshold
+        # Trade threshold in fixed-point units (price units * shares), so records below it are
+        # rejected with one integer compare before any price scaling
+        self._trade_threshold_fixed = round(trade_threshold / PRICE_SCALE)
         self.ticker = ticker.upper()  # Ensure uppercase
         self.audio_manager = AudioManager()
         self.mode = mode
         self.start_time = start_time
         self.end_time = end_time
-        self.latest_quote = {}  # Stores (ask, bid) for each ticker
-        self._lock = threading.Lock()
+        # Latest quote for self.ticker (the only subscribed symbol). Only the Databento callback
+        # thread touches these, so no lock is needed.
+        self._latest_ask = None  # fixed-point (PRICE_SCALE units), None without a quote
+        self._latest_bid = None
+        # Eastern UTC offset (seconds) for the UTC hour convert_timestamp last saw
+        self._et_offset_hour = None
+        self._et_offset = 0
+        # Second (since the epoch) and string of the last convert_timestamp result
+        self._last_ts_sec = None
+        self._last_ts_str = ""
+        # Pre-build the ANSI (prefix, suffix) bytes for every (color, is_big_trade) combination.
+        # Like termcolor, emit plain text when stdout isn't a terminal or NO_COLOR is set.
+        use_color = sys.stdout.isatty() and 'NO_COLOR' not in os.environ
+        ansi = {}
+        for color, fg in ANSI_COLORS.items():
+            for big in (False, True):
+                if use_color:
+                    ansi[(color, big)] = ((ANSI_BOLD if big else b'') + fg, ANSI_RESET + b"\n")
+                else:
+                    ansi[(color, big)] = (b'', b"\n")
+        # Everything a classified trade needs, resolved once:
+        # self._dispatch[cls][is_big_trade] -> (sound event code, ANSI prefix, ANSI suffix)
+        self._dispatch = [
+            ((sound,) + ansi[(color, False)], (big_sound,) + ansi[(color, True)])
+            for color, sound, big_sound in [
+                ('green', SOUND_BUY, SOUND_BUY_BIG),
+                ('red', SOUND_SELL, SOUND_SELL_BIG),
+                ('yellow', SOUND_ABOVE_ASK, SOUND_ABOVE_ASK_BIG),
+                ('magenta', SOUND_BELOW_BID, SOUND_BELOW_BID_BIG),
+                ('white', SOUND_BETWEEN_ASK, SOUND_BETWEEN_ASK),
+                ('white', SOUND_BETWEEN_BID, SOUND_BETWEEN_BID),
+                ('white', SOUND_BETWEEN, SOUND_BETWEEN),
+            ]
+        ]
+        # Sounds are played by a separate thread so the record callback never waits on the mixer
+        self.audio_queue = SoundEventRing()
+        threading.Thread(target=self._audio_dispatch_loop, name="audio-dispatch", daemon=True).start()
+        # Trade lines are formatted and written by another thread, so the record callback only
+        # classifies and queues
+        # Live mode drops lines when the queue is full; replays block instead, so none are lost
+        self._out_queue = queue.Queue(maxsize=OUTPUT_QUEUE_SIZE)
+        self._drop_when_full = (mode == "live")
+        self._dropped_lines = 0
+        threading.Thread(target=self._stdout_writer_loop, name="stdout-writer", daemon=True).start()
         
         if mode == "live":
             self.client = db.Live(key=self.api_key)
@@ -143,10 +385,23 @@ class TradesProcessor:
             self.client = db.Historical(key=self.api_key)
 
     def convert_timestamp(self, ts):
+        """
+        Format a nanosecond UTC timestamp as Eastern time ('%Y-%m-%d %H:%M:%S').
+        Trades in the same second reuse the last string. Otherwise the UTC offset is looked up
+        once per UTC hour (DST switches fall on hour boundaries), so a miss is just integer
+        math and time.gmtime().
+        """
         try:
-            dt_obj = datetime.fromtimestamp(ts / 1e9, tz=ZoneInfo("UTC"))
-            dt_eastern = dt_obj.astimezone(ZoneInfo("America/New_York"))
-            return dt_eastern.strftime('%Y-%m-%d %H:%M:%S')
+            sec = ts // 1_000_000_000
+            if sec == self._last_ts_sec:
+                return self._last_ts_str
+            hour = sec // 3600
+            if hour != self._et_offset_hour:
+                self._et_offset = int(datetime.fromtimestamp(hour * 3600, tz=_ET).utcoffset().total_seconds())
+                self._et_offset_hour = hour
+            self._last_ts_str = "%04d-%02d-%02d %02d:%02d:%02d" % time.gmtime(sec + self._et_offset)[:6]
+            self._last_ts_sec = sec
+            return self._last_ts_str
         except Exception as e:
             logging.error(f"Error converting timestamp {ts}: {e}")
             return "Invalid timestamp"
@@ -160,16 +415,24 @@ class TradesProcessor:
             start=self.start_time.isoformat(),
             end=self.end_time.isoformat(),
         )
-        start_wall = time.time()
-        with open("debug.txt", "w") as f:
+        # Records are written in batches and the clock is only checked once per batch
+        deadline = time.time() + 30
+        record_count = 0
+        batch = []
+        with open("debug.txt", "w", buffering=1 << 20) as f:
             for record in data:
-                if time.time() - start_wall >= 30:
-                    break
-                f.write(str(record) + "\n")
+                batch.append(f"{record}\n")
+                record_count += 1
+                if record_count % 1024 == 0:
+                    f.writelines(batch)
+                    batch.clear()
+                    if time.time() >= deadline:
+                        break
+            f.writelines(batch)
         print("Debug output written to debug.txt (first 30 seconds of raw data).")
 
     def run_live(self):
-        self.client.add_callback(self.handle_record)
+        self.client.add_callback(self.make_record_handler())
         self.client.subscribe(
             dataset=DATASET,
             schema="trades",
@@ -185,140 +448,264 @@ class TradesProcessor:
         self.client.start()
         self.client.block_for_close()
 
+    def fetch_trades(self, start, end):
+        """
+        Fetch the tbbo records in [start, end) as NumPy arrays: (ts_event ns, price, amount, ask, bid),
+        with prices in dollars and NaN where a quote side is undefined. Returns None if there is no data.
+        """
+        logging.info(f"Fetching data from {start.isoformat()} to {end.isoformat()}")
+        # Decode straight into a packed structured array: no per-record Python objects, and
+        # no DataFrame (whose mapped 'symbol' column alone holds one str per record)
+        records = self.client.timeseries.get_range(
+            dataset=DATASET,
+            symbols=[self.ticker],
+            schema="tbbo",
+            stype_in="raw_symbol",
+            start=start.isoformat(),
+            end=end.isoformat(),
+        ).to_ndarray()
+        if len(records) == 0:
+            return None
+        price = records["price"] * PRICE_SCALE
+        raw_ask = records["ask_px_00"]
+        raw_bid = records["bid_px_00"]
+        return (
+            records["ts_event"].astype(np.int64),
+            price,
+            price * records["size"],
+            np.where(raw_ask == UNDEF_PRICE, np.nan, raw_ask * PRICE_SCALE),
+            np.where(raw_bid == UNDEF_PRICE, np.nan, raw_bid * PRICE_SCALE),
+        )
+
+    def output_trades(self, ts, price, amount, ask, bid, pace=False):
+        """
+        Classify the trades above the threshold in one vectorized pass, then print/play them in order.
+        With 'pace', each trade is held back until its offset from ts[0] has elapsed in wall-clock
+        time (anchored with perf_counter, so sleep overshoot doesn't accumulate).
+        Returns the number of trades output.
+        """
+        wall0 = time.perf_counter()
+        ts0 = ts[0]
+        mask = amount >= self.trade_threshold
+        ts = ts[mask]
+        price = price[mask]
+        amount = amount[mask]
+        ask = ask[mask]
+        bid = bid[mask]
+        classes = classify_trades(price, ask, bid)
+
+        # Only the (typically tiny) filtered subset reaches Python-level output
+        for i in range(len(price)):
+            ts_i = int(ts[i])
+            if pace:
+                delay = wall0 + (ts_i - ts0) / 1e9 - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            ask_i = None if np.isnan(ask[i]) else float(ask[i])
+            bid_i = None if np.isnan(bid[i]) else float(bid[i])
+            self.output_trade(int(classes[i]), float(price[i]), ask_i, bid_i, float(amount[i]), ts_i, self.ticker)
+        return len(price)
+
+    def run_historical_vectorized(self):
+        """
+        Non-realtime historical run: classify the whole window at once and print/play the trades
+        above the threshold without pacing.
+        """
+        trades = self.fetch_trades(self.start_time, self.end_time)
+        if trades is None:
+            logging.info("No data returned.")
+            return
+        count = self.output_trades(*trades)
+        logging.info(f"Processed {len(trades[0])} records, {count} above threshold.")
+
     def run_historical(self):
         current_start = self.start_time
         current_end = self.end_time
 
-        while True:
-            logging.info(f"Fetching data from {current_start.isoformat()} to {current_end.isoformat()}")
-            data = list(self.client.timeseries.get_range(
-                dataset=DATASET,
-                symbols=[self.ticker],
-                schema="tbbo",
-                stype_in="raw_symbol",
-                start=current_start.isoformat(),
-                end=current_end.isoformat(),
-            ))
-            if not data:
-                logging.info("No more data returned. Exiting historical loop.")
-                break
-
-            prev_ts = None
-            for record in data:
-                current_ts = getattr(record, "ts_event", None)
-                if prev_ts is not None and current_ts is not None:
-                    sleep_time = (current_ts - prev_ts) / 1e9
-                    sleep_time = max(0, sleep_time)
-                    time.sleep(sleep_time)
-                self.handle_record(record)
-                prev_ts = current_ts
-
-                if current_ts is not None:
-                    record_dt = datetime.fromtimestamp(current_ts / 1e9, tz=ZoneInfo("UTC"))
-                    time_left = current_end - record_dt
-                    if time_left < timedelta(minutes=2):
-                        logging.info("Extending window by 1 hour.")
-                        current_start = current_end
-                        current_end = current_end + timedelta(hours=1)
-                        break
-            else:
-                logging.info("Finished processing current window.")
-                break
+        # The next window is fetched in the background while the current one plays
+        with ThreadPoolExecutor(max_workers=1) as prefetch:
+            next_window = None
+            while True:
+                if next_window is not None:
+                    trades = next_window.result()
+                    next_window = None
+                else:
+                    trades = self.fetch_trades(current_start, current_end)
+                if trades is None:
+                    logging.info("No more data returned. Exiting historical loop.")
+                    break
 
-    def handle_record(self, record):
+                # Replay up to and including the first record within 2 minutes of the window's end,
+                # then extend the window. The pacing anchor is reset per window so the fetch time of
+                # an extension isn't replayed as a burst.
+                extend_after_ns = int(current_end.timestamp()) * 1_000_000_000 - 120 * 1_000_000_000
+                late = np.flatnonzero(trades[0] > extend_after_ns)
+                if len(late):
+                    stop = late[0] + 1
+                    trades = tuple(column[:stop] for column in trades)
+                    next_window = prefetch.submit(self.fetch_trades, current_end, current_end + timedelta(hours=1))
+                self.output_trades(*trades, pace=True)
+
+                if len(late):
+                    logging.info("Extending window by 1 hour.")
+                    current_start = current_end
+                    current_end = current_end + timedelta(hours=1)
+                else:
+                    logging.info("Finished processing current window.")
+                    break
+
+    def output_trade(self, cls, price, ask, bid, amount, ts, ticker):
+        """
+        Queue the sound for a classified trade and hand its fields to the stdout writer thread,
+        which does the formatting. 'ask'/'bid' are None when no quote is known.
+        """
+        sound, prefix, suffix = self._dispatch[cls][amount >= self.big_threshold]
+        if not self.audio_queue.push(sound) and self.audio_queue.dropped % 100 == 1:
+            logging.warning(f"Sound queue full; dropped {self.audio_queue.dropped} sounds so far")
+
+        item = (prefix, suffix, price, ask, bid, amount, ts, ticker)
+        if not self._drop_when_full:
+            self._out_queue.put(item)
+            return
         try:
-            ticker = getattr(record, 'symbol', self.ticker).upper()
-
-            # Process BBO updates (live mode)
-            raw_bid = getattr(record, 'bid_px_00', None)
-            raw_ask = getattr(record, 'ask_px_00', None)
-            if (raw_bid is None or raw_ask is None) and hasattr(record, 'levels') and record.levels:
-                level0 = record.levels[0]
-                raw_bid = getattr(level0, 'bid_px', raw_bid)
-                raw_ask = getattr(level0, 'ask_px', raw_ask)
-            
-            def convert_price(value):
-                return value if value < 10000 else value / 1e9
-
-            if raw_bid is not None and raw_ask is not None:
-                bid = convert_price(raw_bid)
-                ask = convert_price(raw_ask)
-                with self._lock:
-                    self.latest_quote[ticker] = (ask, bid)
-                    logging.debug(f"(BBO) Updated quote for {ticker}: ask={ask}, bid={bid}")
-                if not hasattr(record, 'price'):  # Pure BBO update
+            self._out_queue.put_nowait(item)
+        except queue.Full:
+            self._dropped_lines += 1
+            if self._dropped_lines % 100 == 1:
+                logging.warning(f"Output queue full; dropped {self._dropped_lines} trades so far")
+
+    def format_trade(self, prefix, suffix, price, ask, bid, amount, ts, ticker):
+        """
+        Build the output line (ANSI prefix/suffix included) for a trade queued by output_trade.
+        """
+        mid_str = f"{(ask + bid) / 2.0:,.2f}" if (ask is not None and bid is not None) else "N/A"
+        line = f"Price: {price:,.2f} | Mid: {mid_str} | Amount: ${format_amount(amount)} | Time: {self.convert_timestamp(ts)} | Ticker: {ticker}"
+        return prefix + line.encode('ascii', 'replace') + suffix
+
+    def update_quote(self, level):
+        """
+        Store the top-of-book from a record's levels[0]; a side with no price (UNDEF_PRICE) clears the quote.
+        """
+        bid_px = level.bid_px
+        ask_px = level.ask_px
+        if bid_px == UNDEF_PRICE or ask_px == UNDEF_PRICE:
+            self._latest_bid = self._latest_ask = None
+        else:
+            self._latest_bid = bid_px
+            self._latest_ask = ask_px
+        logging.debug(f"(BBO) Updated quote for {self.ticker}: ask={ask_px}, bid={bid_px} (raw)")
+
+    def make_record_handler(self):
+        """
+        Build the live record callback. Everything that is fixed once the processor is configured
+        (record classes, thresholds, ticker, bound methods) is captured in the closure, so the
+        per-record path reads fast locals/cells instead of module and instance attributes.
+        """
+        # databento 0.48 exports bbo-1s records as BBO1SMsg (there is no db.BBOMsg)
+        BBO1SMsg = db.BBO1SMsg
+        TradeMsg = db.TradeMsg
+        MBP1Msg = db.MBP1Msg
+        trade_threshold_fixed = self._trade_threshold_fixed
+        ticker = self.ticker
+        update_quote = self.update_quote
+        output_trade = self.output_trade
+
+        def handle_record(record):
+            try:
+                record_type = record.__class__
+                # Live bbo-1s records only update the quote
+                if record_type is BBO1SMsg:
+                    update_quote(record.levels[0])
+                    return
+                # Anything else but trades (symbol mappings, system messages) is ignored
+                if record_type is not TradeMsg and record_type is not MBP1Msg:
                     return
 
-            # Process trade events
-            raw_price = getattr(record, 'price', None)
-            raw_volume = getattr(record, 'size', None)
-            ts = getattr(record, 'ts_event', None)
-            if raw_price is None or raw_volume is None or ts is None:
-                return
-
-            price = convert_price(raw_price)
-            volume = raw_volume
-            amount = price * volume
-
-            # Filter out trades below the threshold
-            if amount < self.trade_threshold:
-                return            
-
-            timestamp_str = self.convert_timestamp(ts)
-            
-            with self._lock:
-                ask, bid = self.latest_quote.get(ticker, (None, None))
-
-            mid_px = (ask + bid) / 2.0 if (ask is not None and bid is not None) else None
-            is_big_trade = (amount >= self.big_threshold)
-
-            # Determine color and sound
-            if ask is None or bid is None:
-                color = 'white'
-                self.audio_manager.play_between_bid_ask_sound()
-            else:
-                if abs(price - ask) < EPSILON:
-                    color = 'green'
-                    (self.audio_manager.play_buy_sound_big() if is_big_trade else self.audio_manager.play_buy_sound())
-                elif abs(price - bid) < EPSILON:
-                    color = 'red'
-                    (self.audio_manager.play_sell_sound_big() if is_big_trade else self.audio_manager.play_sell_sound())
-                elif price > (ask + EPSILON):
-                    color = 'yellow'
-                    (self.audio_manager.play_above_ask_sound_big() if is_big_trade else self.audio_manager.play_above_ask_sound())
-                elif price < (bid - EPSILON):
-                    color = 'magenta'
-                    (self.audio_manager.play_below_bid_sound_big() if is_big_trade else self.audio_manager.play_below_bid_sound())
-                else:
-                    distance_to_ask = abs(price - ask)
-                    distance_to_bid = abs(price - bid)
-                    color = 'white'
-                    if abs(distance_to_ask - distance_to_bid) < 1e-9:
-                        self.audio_manager.play_between_bid_ask_sound()
-                    elif distance_to_ask < distance_to_bid:
-                        self.audio_manager.play_between_bid_ask_sound_ask()
-                    else:
-                        self.audio_manager.play_between_bid_ask_sound_bid()
-
-            formatted_amount = format_amount(amount)
-            price_str = f"{price:,.2f}"
-            mid_str = f"{mid_px:,.2f}" if mid_px is not None else "N/A"
-            attrs = ['bold'] if is_big_trade else []
-            print(colored(
-                f"Price: {price_str} | Mid: {mid_str} | Amount: ${formatted_amount} | Time: {timestamp_str} | Ticker: {ticker}",
-                color=color,
-                attrs=attrs
-            ))
-        except Exception as e:
-            logging.error(f"Error handling record: {e}")
+                # Apply the threshold on the raw fixed-point amount before any scaling or quote work
+                raw_price = record.price
+                size = record.size
+                if raw_price * size < trade_threshold_fixed:
+                    return
+                price = raw_price * PRICE_SCALE
+                amount = price * size
+
+                # tbbo records carry the quote in effect just before the trade
+                if record_type is MBP1Msg:
+                    update_quote(record.levels[0])
+                ts = record.ts_event
+
+                raw_ask = self._latest_ask
+                raw_bid = self._latest_bid
+                if raw_ask is None or raw_bid is None:
+                    # Without a quote, treat the trade as "between bid and ask"
+                    output_trade(BETWEEN, price, None, None, amount, ts, ticker)
+                    return
+                # Classify on the raw fixed-point prices; only the display needs dollars
+                cls = classify_trade(raw_price, raw_ask, raw_bid, EPSILON_FIXED)
+                output_trade(cls, price, raw_ask * PRICE_SCALE, raw_bid * PRICE_SCALE, amount, ts, ticker)
+            except Exception as e:
+                logging.error(f"Error handling record: {e}")
+
+        return handle_record
+
+    def _audio_dispatch_loop(self):
+        """
+        Play sound events pushed by handle_record, polling the ring every millisecond when it is empty.
+        Bursts of the same sound are coalesced to one play per SOUND_MIN_INTERVAL (big trades excepted).
+        """
+        ring = self.audio_queue
+        play_fns = self.audio_manager.play_fns
+        # Earliest monotonic time each sound may play again
+        next_play = [0.0] * len(play_fns)
+        min_interval = [0.0 if code in SOUND_ALWAYS_PLAY else SOUND_MIN_INTERVAL for code in range(len(play_fns))]
+        while True:
+            code = ring.pop()
+            if code is None:
+                time.sleep(0.001)
+                continue
+            now = time.monotonic()
+            if now < next_play[code]:
+                continue
+            next_play[code] = now + min_interval[code]
+            try:
+                play_fns[code]()
+            except Exception as e:
+                logging.error(f"Error playing sound: {e}")
+
+    def _stdout_writer_loop(self):
+        """
+        Format the trades queued by output_trade and write them to the binary stdout,
+        one write + flush per drained batch.
+        """
+        out_queue = self._out_queue
+        out = sys.stdout.buffer
+        format_trade = self.format_trade
+        while True:
+            items = [out_queue.get()]
+            while True:
+                try:
+                    items.append(out_queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                out.write(b"".join([format_trade(*item) for item in items]))
+                out.flush()
+            except Exception as e:
+                logging.error(f"Error writing trade output: {e}")
+            for _ in items:
+                out_queue.task_done()
 
     def run(self):
         if self.mode == "live":
             self.run_live()
         elif self.mode == "historical_debug":
             self.run_historical_debug()
+        elif self.mode == "historical_fast":
+            self.run_historical_vectorized()
         else:
             self.run_historical()
+        # Let the writer thread print whatever is still queued before the process exits
+        self._out_queue.join()
 
 def main():
     """
@@ -326,11 +713,13 @@ def main():
       Live mode: python script.py [ticker] [threshold] [big_threshold]
       Historical mode: python script.py [ticker] [threshold] [big_threshold] [YYYYMMDD] [hhmm(am/pm)]
       Historical debug: python script.py [ticker] [threshold] [big_threshold] [YYYYMMDD] [hhmm(am/pm)] debug
+      Historical fast (no real-time pacing): python script.py [ticker] [threshold] [big_threshold] [YYYYMMDD] [hhmm(am/pm)] fast
       
       Examples:
         python script.py TSLA 90000 490000
         python script.py tsla 90000 490000 20250214 0930am
         python script.py tsla 90000 490000 20250214 0930am debug
+        python script.py tsla 90000 490000 20250214 0930am fast
     """
     arg_len = len(sys.argv)
     if arg_len not in (4, 6, 7):
@@ -351,11 +740,13 @@ def main():
         time_str = sys.argv[5]
         if arg_len == 7 and sys.argv[6].lower() == "debug":
             mode = "historical_debug"
+        elif arg_len == 7 and sys.argv[6].lower() == "fast":
+            mode = "historical_fast"
         try:
             dt_date = datetime.strptime(date_str, "%Y%m%d").date()
             dt_time = datetime.strptime(time_str.lower(), "%I%M%p").time()
-            local_dt = datetime.combine(dt_date, dt_time, tzinfo=ZoneInfo("America/New_York"))
-            start_dt = local_dt.astimezone(ZoneInfo("UTC"))
+            local_dt = datetime.combine(dt_date, dt_time, tzinfo=_ET)
+            start_dt = local_dt.astimezone(_UTC)
             end_dt = start_dt + timedelta(hours=1)
         except Exception as e:
             print(f"Error parsing date/time: {e}")
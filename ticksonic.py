@@ -1,20 +1,34 @@
 import os
 import sys
-import math
+import json
 import logging
 import time
+import queue
 import threading
-from datetime import datetime
+from functools import lru_cache
 
 import pygame
 import pygame.sndarray
 import numpy as np  
 from polygon import WebSocketClient
-from polygon.websocket.models import EquityTrade, EquityQuote
-from termcolor import colored
 
 from dotenv import load_dotenv
 
+# Prefer orjson for the per-frame parse; fall back to the stdlib parser if it isn't installed
+try:
+    import orjson
+
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
+# Prefer soxr's band-limited resampler for the pitch-shifted sounds; fall back to
+# nearest-neighbour resampling if it isn't installed
+try:
+    import soxr
+except ImportError:
+    soxr = None
+
 # Load .env file if it exists, without overriding existing environment variables
 load_dotenv()
 
@@ -24,14 +38,6 @@ if '--silent' in sys.argv:
     silent = True
     sys.argv.remove('--silent')
 
-# Initialize Pygame mixer (only if not silent)
-if not silent:
-    try:
-        pygame.mixer.init()
-    except Exception as e:
-        logging.error(f"Could not initialize pygame mixer: {e}")
-        sys.exit(1)
-
 # Set up logging
 logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(message)s')
 # logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
@@ -48,12 +54,57 @@ ABOVE_ASK_SOUND_PATH = os.getenv('ABOVE_ASK_SOUND_PATH', 'sounds/above_ask.wav')
 BELOW_BID_SOUND_PATH = os.getenv('BELOW_BID_SOUND_PATH', 'sounds/below_bid.wav')
 BETWEEN_BID_ASK_SOUND_PATH = os.getenv('BETWEEN_BID_ASK_SOUND_PATH', 'sounds/between_bid_ask.wav')
 
+# AudioManager sound attributes loaded straight from a file
+SOUND_FILES = {
+    'buy_sound': BUY_SOUND_PATH,
+    'sell_sound': SELL_SOUND_PATH,
+    'above_ask_sound': ABOVE_ASK_SOUND_PATH,
+    'below_bid_sound': BELOW_BID_SOUND_PATH,
+    'between_bid_ask_sound': BETWEEN_BID_ASK_SOUND_PATH,
+}
+# AudioManager sound attributes derived from another one: (source attribute, pitch factor)
+PITCHED_SOUNDS = {
+    # Pitched versions for "big" trades
+    'above_ask_sound_big': ('above_ask_sound', 1.5),
+    'buy_sound_big': ('buy_sound', 1.5),
+    'sell_sound_big': ('sell_sound', 0.8),
+    'below_bid_sound_big': ('below_bid_sound', 0.8),
+    # Closer to bid or ask sounds
+    'between_bid_ask_sound_ask': ('between_bid_ask_sound', 1.5),
+    'between_bid_ask_sound_bid': ('between_bid_ask_sound', 0.8),
+}
+
+# Mixer buffer in sample frames: the audio latency floor (256 frames is ~6ms at 44.1kHz).
+# Raise it if playback crackles on your sound card.
+MIXER_BUFFER_SIZE = int(os.getenv('MIXER_BUFFER_SIZE', 256))
+
+# Mixer channels the sounds are played on round-robin (a power of two, so the index is a bit mask)
+MIXER_CHANNELS = 16
+
 # Secondary threshold for “big” trades (e.g., $490k)
 BIG_THRESHOLD = 490000.0
 
 # Epsilon for float comparisons
 EPSILON = 1e-3
 
+# Trade classifications relative to the latest quote, used to index TradesProcessor's tables
+AT_ASK, AT_BID, ABOVE_ASK, BELOW_BID, BETWEEN, BETWEEN_NEAR_ASK, BETWEEN_NEAR_BID = range(7)
+
+# ANSI escape sequences for trade output (same codes termcolor emits)
+ANSI_COLORS = {
+    'green': '\x1b[32m',
+    'red': '\x1b[31m',
+    'yellow': '\x1b[33m',
+    'magenta': '\x1b[35m',
+    'white': '\x1b[97m',
+}
+ANSI_BOLD = '\x1b[1m'
+ANSI_ON_GREY = '\x1b[40m'
+ANSI_RESET = '\x1b[0m'
+
+# Max trade lines waiting for the stdout writer thread before non-big ones are dropped
+OUTPUT_QUEUE_SIZE = 2000
+
 def smart_format(price):
     # If rounding to 2 decimals preserves the value, show exactly 2 decimals
     if round(price, 4) == round(price, 2):
@@ -69,47 +120,118 @@ def format_amount(amount: float) -> str:
       - otherwise => regular format with commas and 2 decimals.
     Floors to one decimal place in the 'K'/'million' cases, removing trailing .0 if present.
     """
-    if amount >= 1_000_000:
-        millions = amount / 1_000_000
-        floored = math.floor(millions * 10) / 10
-        if floored.is_integer():
-            floored = int(floored)
-        return f"{floored} million"
-    elif amount >= 1_000:
-        thousands = amount / 1_000
-        floored = math.floor(thousands * 10) / 10
-        if floored.is_integer():
-            floored = int(floored)
-        return f"{floored}K"
-    else:
-        # Regular numeric format with commas and 2 decimals
-        return f"{amount:,.2f}"
+    if amount >= 1_000:
+        # Integer arithmetic on whole dollars instead of float floor/is_integer round trips
+        dollars = int(amount)
+        if dollars >= 1_000_000:
+            whole, tenth = divmod(dollars // 100_000, 10)
+            unit = " million"
+        else:
+            whole, tenth = divmod(dollars // 100, 10)
+            unit = "K"
+        return f"{whole}.{tenth}{unit}" if tenth else f"{whole}{unit}"
+    # Regular numeric format with commas and 2 decimals
+    return f"{amount:,.2f}"
+
+@lru_cache(maxsize=4096)
+def _format_amount_bucket(bucket: int) -> str:
+    """
+    format_amount() of bucket * $100. The K/million output is floored to one decimal, so it only
+    depends on the amount floored to $100, and trades cluster on a small set of those buckets.
+    """
+    return format_amount(bucket * 100.0)
+
+def format_amount_cached(amount: float) -> str:
+    """
+    Cached format_amount(). Amounts under $1,000 print to the cent, so they bypass the cache.
+    """
+    if amount >= 1_000:
+        return _format_amount_bucket(int(amount) // 100)
+    return format_amount(amount)
+
+def quote_bounds(ask: float, bid: float) -> tuple:
+    """
+    Precompute a quote's EPSILON bands once per quote: (ask_lo, ask_hi, bid_lo, bid_hi, ask, bid).
+    """
+    return (ask - EPSILON, ask + EPSILON, bid - EPSILON, bid + EPSILON, ask, bid)
+
+def classify_trade(price: float, quote: tuple) -> int:
+    """
+    Classify a trade price against a quote_bounds() tuple, returning one of the
+    AT_ASK..BETWEEN_NEAR_BID codes.
+    """
+    ask_lo, ask_hi, bid_lo, bid_hi, ask, bid = quote
+    if ask_lo < price < ask_hi:
+        return AT_ASK
+    if bid_lo < price < bid_hi:
+        return AT_BID
+    if price > ask_hi:
+        return ABOVE_ASK
+    if price < bid_lo:
+        return BELOW_BID
+    distance_to_ask = abs(price - ask)
+    distance_to_bid = abs(price - bid)
+    # check if price is half-way between bid and ask
+    if abs(distance_to_ask - distance_to_bid) < 1e-9:
+        return BETWEEN
+    return BETWEEN_NEAR_ASK if distance_to_ask < distance_to_bid else BETWEEN_NEAR_BID
 
 class AudioManager:
     def __init__(self):
         """
-        Preload all sounds using Pygame to avoid repeated file I/O.
+        Sounds are loaded, and pitch-shifted, on first use (see __getattr__), and the Pygame mixer
+        is started with the first one, so categories that never trade cost nothing at startup.
+        Only check here that the sound files exist.
         """
-        try:
-            self.buy_sound = pygame.mixer.Sound(BUY_SOUND_PATH)
-            self.sell_sound = pygame.mixer.Sound(SELL_SOUND_PATH)
-            self.above_ask_sound = pygame.mixer.Sound(ABOVE_ASK_SOUND_PATH)
-            self.below_bid_sound = pygame.mixer.Sound(BELOW_BID_SOUND_PATH)
-            self.between_bid_ask_sound = pygame.mixer.Sound(BETWEEN_BID_ASK_SOUND_PATH)
-        except Exception as e:
-            logging.error(f"Error loading sound files: {e}")
+        missing = [path for path in SOUND_FILES.values() if not os.path.isfile(path)]
+        if missing:
+            logging.error(f"Error loading sound files: not found: {', '.join(missing)}")
             sys.exit(1)
 
-        # Pre-generate pitched versions for "big" trades
-        self.above_ask_sound_big = self.pitch_shift_sound(self.above_ask_sound, pitch_factor=1.5)
-        self.buy_sound_big = self.pitch_shift_sound(self.buy_sound, pitch_factor=1.5)
-        self.sell_sound_big = self.pitch_shift_sound(self.sell_sound, pitch_factor=0.8)
-        self.below_bid_sound_big = self.pitch_shift_sound(self.below_bid_sound, pitch_factor=0.8)
+    def __getattr__(self, name):
+        """
+        Load a sound attribute the first time it is read and cache it on the instance, so later
+        reads are plain attribute hits. Sounds that fail to load are cached as None (not played).
+        """
+        if name in SOUND_FILES:
+            try:
+                self.start_mixer()
+                value = pygame.mixer.Sound(SOUND_FILES[name])
+            except Exception as e:
+                logging.error(f"Error loading sound {SOUND_FILES[name]}: {e}")
+                value = None
+        elif name in PITCHED_SOUNDS:
+            source, pitch_factor = PITCHED_SOUNDS[name]
+            value = self.pitch_shift_sound(getattr(self, source), pitch_factor=pitch_factor)
+        elif name == '_channels':
+            # Only read once a sound has loaded, so the mixer is already running
+            value = [pygame.mixer.Channel(i) for i in range(MIXER_CHANNELS)]
+            self._next_channel = 0
+        else:
+            raise AttributeError(f"{type(self).__name__!r} object has no attribute {name!r}")
+        setattr(self, name, value)
+        return value
+
+    @staticmethod
+    def start_mixer():
+        """
+        Start the Pygame mixer, if it isn't running yet, with a MIXER_BUFFER_SIZE buffer and
+        MIXER_CHANNELS channels. The mixer runs in mono 16-bit, so sounds are downmixed once as they
+        load and every play mixes half the samples of a stereo sound.
+        """
+        if not pygame.mixer.get_init():
+            pygame.mixer.init(size=-16, channels=1, buffer=MIXER_BUFFER_SIZE)
+            pygame.mixer.set_num_channels(MIXER_CHANNELS)
+
+    def _play(self, sound):
+        """
+        Play 'sound' on the next channel of the pool, instead of letting Sound.play() search for
+        a free one. Under a burst the oldest sound is cut off rather than the new one being dropped.
+        """
+        if sound is not None:
+            self._channels[self._next_channel & (MIXER_CHANNELS - 1)].play(sound)
+            self._next_channel += 1
 
-        # Closer to bid or ask sounds
-        self.between_bid_ask_sound_ask = self.pitch_shift_sound(self.between_bid_ask_sound, pitch_factor=1.5)
-        self.between_bid_ask_sound_bid = self.pitch_shift_sound(self.between_bid_ask_sound, pitch_factor=0.8)
-        
     @staticmethod
     def pitch_shift_sound(original_sound: pygame.mixer.Sound, pitch_factor: float) -> pygame.mixer.Sound:
         """
@@ -123,91 +245,68 @@ class AudioManager:
 
         # Extract samples as a NumPy array
         sound_array = pygame.sndarray.array(original_sound)
-
-        # Get the number of samples
-        if sound_array.ndim == 1:
-            # Mono
-            num_samples = sound_array.shape[0]
-        else:
-            # Stereo or multi-channel
-            num_samples = sound_array.shape[0]
-
-        # Generate new sample indices based on pitch_factor
-        new_indices = np.arange(0, num_samples, 1.0 / pitch_factor)
-        new_indices = np.round(new_indices).astype(np.int32)
-
-        # Clip indices so we don't go out of range
-        new_indices = new_indices[new_indices < num_samples]
-
-        # If all indices are out of range, fall back to original sound
-        if len(new_indices) == 0:
+        num_samples = sound_array.shape[0]  # works for mono and multi-channel alike
+
+        if soxr is not None and num_samples > 1:
+            # Band-limited resample to num_samples * pitch_factor frames (rows are frames, columns
+            # channels), clipped back into the sample type since the filter can overshoot
+            pitched = soxr.resample(sound_array.astype(np.float32), 1.0, pitch_factor)
+            if np.issubdtype(sound_array.dtype, np.integer):
+                info = np.iinfo(sound_array.dtype)
+                pitched = np.clip(np.rint(pitched), info.min, info.max)
+            pitched_array = np.ascontiguousarray(pitched, dtype=sound_array.dtype)
+            if pitched_array.size:
+                return pygame.sndarray.make_sound(pitched_array)
+
+        # Output sample i comes from source sample i / pitch_factor, computed in one integer pass
+        # (always in range, so no rounding, clipping or masking step is needed)
+        new_len = int(num_samples * pitch_factor)
+        if new_len == 0:
             logging.warning(
                 f"Pitch shift resulted in empty array (pitch_factor={pitch_factor}). "
                 "Returning original sound."
             )
             return original_sound
+        new_indices = np.arange(new_len, dtype=np.int64) * num_samples // new_len
 
-        # Resample
-        if sound_array.ndim == 1:
-            # Mono
-            pitched_array = sound_array[new_indices]
-        else:
-            # Multi-channel
-            pitched_array = sound_array[new_indices, :]
-
-        if pitched_array.size == 0:
-            logging.warning(
-                f"Pitch shift array is empty after indexing (pitch_factor={pitch_factor}). "
-                "Returning original sound."
-            )
-            return original_sound
+        # Resample (take() gathers whole rows for multi-channel arrays into a C-contiguous result)
+        pitched_array = sound_array.take(new_indices, axis=0)
 
         new_sound = pygame.sndarray.make_sound(pitched_array)
         return new_sound
                     
     def play_above_ask_sound(self):
-        if self.above_ask_sound is not None:
-            self.above_ask_sound.play()
+        self._play(self.above_ask_sound)
 
     def play_above_ask_sound_big(self):
-        if self.above_ask_sound_big is not None:
-            self.above_ask_sound_big.play()
+        self._play(self.above_ask_sound_big)
 
     def play_buy_sound(self):
-        if self.buy_sound is not None:
-            self.buy_sound.play()
+        self._play(self.buy_sound)
 
     def play_buy_sound_big(self):
-        if self.buy_sound_big is not None:
-            self.buy_sound_big.play()    
+        self._play(self.buy_sound_big)
             
     def play_between_bid_ask_sound_ask(self):
-        if self.between_bid_ask_sound_ask is not None:
-            self.between_bid_ask_sound_ask.play()
+        self._play(self.between_bid_ask_sound_ask)
 
     def play_between_bid_ask_sound(self):
-        if self.between_bid_ask_sound is not None:
-            self.between_bid_ask_sound.play()
+        self._play(self.between_bid_ask_sound)
 
     def play_between_bid_ask_sound_bid(self):
-        if self.between_bid_ask_sound_bid is not None:
-            self.between_bid_ask_sound_bid.play()
+        self._play(self.between_bid_ask_sound_bid)
 
     def play_sell_sound(self):
-        if self.sell_sound is not None:
-            self.sell_sound.play()
+        self._play(self.sell_sound)
 
-    def play_sell_sound_big(self):             
-        if self.sell_sound_big is not None:
-            self.sell_sound_big.play()
+    def play_sell_sound_big(self):
+        self._play(self.sell_sound_big)
             
     def play_below_bid_sound(self):
-        if self.below_bid_sound is not None:
-            self.below_bid_sound.play()
+        self._play(self.below_bid_sound)
 
     def play_below_bid_sound_big(self):
-        if self.below_bid_sound_big is not None:
-            self.below_bid_sound_big.play()
+        self._play(self.below_bid_sound_big)
 
 # Define a silent version of AudioManager whose methods do nothing.
 class SilentAudioManager:
@@ -231,163 +330,186 @@ class TradesProcessor:
         self.big_threshold = big_threshold        
         # Use SilentAudioManager if silent mode is requested; otherwise use the regular AudioManager.
         self.audio_manager = SilentAudioManager() if silent else AudioManager()
-        self.client = WebSocketClient(api_key=self.api_key)
+        # raw=True hands us each frame undecoded, so it's parsed once, into plain dicts,
+        # instead of the client building a model object per message
+        self.client = WebSocketClient(api_key=self.api_key, raw=True)
         self.subscriptions = []
-        # Store quotes in an instance dict rather than a global.
+        # quote_bounds() tuple per ticker, or None while either side is unknown. Only the WebSocket
+        # callback thread reads and writes it, and replacing a tuple under a dict key is atomic,
+        # so no lock is needed.
         self.latest_quotes = {}
-        # Threading lock to prevent race conditions in handle_quote_message/handle_trade_message.
-        self._lock = threading.Lock()
+        # Message handler by Polygon event type ("ev"); anything else is logged as unexpected
+        self._msg_handlers = {
+            'T': self.handle_trade_message,
+            'Q': self.handle_quote_message,
+            'status': self.handle_status_message,
+        }
+        # (second, string) last formatted by convert_timestamp
+        self._last_ts = (None, "")
+        # Per trade classification: (normal, big) play methods, resolved once
+        am = self.audio_manager
+        self._sound_table = (
+            (am.play_buy_sound, am.play_buy_sound_big),
+            (am.play_sell_sound, am.play_sell_sound_big),
+            (am.play_above_ask_sound, am.play_above_ask_sound_big),
+            (am.play_below_bid_sound, am.play_below_bid_sound_big),
+            (am.play_between_bid_ask_sound, am.play_between_bid_ask_sound),
+            (am.play_between_bid_ask_sound_ask, am.play_between_bid_ask_sound_ask),
+            (am.play_between_bid_ask_sound_bid, am.play_between_bid_ask_sound_bid),
+        )
+        # Per trade classification: (normal, big) ANSI (prefix, suffix) pairs; big trades are bold on grey.
+        # Like termcolor, emit plain text when stdout isn't a terminal or NO_COLOR is set.
+        use_color = sys.stdout.isatty() and 'NO_COLOR' not in os.environ
+        def ansi(color, big):
+            if not use_color:
+                return ('', '\n')
+            return ((ANSI_BOLD + ANSI_ON_GREY if big else '') + ANSI_COLORS[color], ANSI_RESET + '\n')
+        self._ansi_table = tuple(
+            (ansi(color, False), ansi(color, True))
+            for color in ('green', 'red', 'yellow', 'magenta', 'white', 'white', 'white')
+        )
+        # Trade lines are formatted and written by another thread, so terminal I/O never
+        # slows down the WebSocket callback thread; when the terminal can't keep up, lines for
+        # non-big trades are dropped instead of blocking it
+        self._out_queue = queue.Queue(maxsize=OUTPUT_QUEUE_SIZE)
+        self._dropped_lines = 0
+        threading.Thread(target=self._stdout_writer_loop, name="stdout-writer", daemon=True).start()
 
     def convert_timestamp(self, ts):
         """
         Convert a timestamp (assumed ms) to a formatted string.
         If ts is out of expected range, return 'Invalid timestamp'.
         Adjust if your data is in microseconds/nanoseconds.
+        Timestamps in the same second as the previous one reuse its string.
         """
         logging.debug(f"Raw timestamp: {ts}")
         if ts and 1e12 <= ts < 2e13:
-            dt_obj = datetime.fromtimestamp(ts / 1e3)
-            return dt_obj.strftime('%M:%S')
+            sec = int(ts) // 1000
+            last_sec, last_str = self._last_ts
+            if sec == last_sec:
+                return last_str
+            # time.localtime() + integer formatting: same '%M:%S' as datetime.strftime, minus the
+            # datetime object
+            ts_str = "%02d:%02d" % time.localtime(sec)[4:6]
+            # One tuple, so a reader on another thread never pairs a second with the wrong string
+            self._last_ts = (sec, ts_str)
+            return ts_str
         else:
             return "Invalid timestamp"
 
-    def handle_quote_message(self, quote: EquityQuote):
-        try:
-            ticker = quote.symbol
-            with self._lock:
-                self.latest_quotes[ticker] = {
-                    'ask': quote.ask_price,
-                    'bid': quote.bid_price
-                }
-
-            formatted_time = self.convert_timestamp(quote.timestamp)
-            logging.info(f"Quote {ticker} at {formatted_time}: "
-                         f"Ask={quote.ask_price}, Bid={quote.bid_price}")
-        except Exception as e:
-            logging.error(f"Error handling quote message: {e}")
+    def handle_quote_message(self, quote: dict):
+        """
+        Handle a decoded Polygon quote: {'sym', 'ap' (ask price), 'bp' (bid price), 't' (ms), ...}.
+        """
+        ticker = quote['sym']
+        ask, bid = quote.get('ap'), quote.get('bp')
+        self.latest_quotes[ticker] = None if ask is None or bid is None else quote_bounds(ask, bid)
 
-    def handle_trade_message(self, trade: EquityTrade):
-        try:
-            ticker = trade.symbol
-            price = trade.price
-            volume = trade.size
-            amount = price * volume
-            timestamp_str = self.convert_timestamp(trade.timestamp)
-
-            # Skip small trades
-            if amount < self.trade_threshold:
-                logging.debug(f"Trade {ticker} at {timestamp_str} ignored (Amount: ${amount:.2f})")
-                return
-
-            with self._lock:
-                quote = self.latest_quotes.get(ticker, {})
-                ask = quote.get('ask')
-                bid = quote.get('bid')
-
-            # Decide if the trade is "big" for second threshold
-            is_big_trade = (amount >= self.big_threshold)
-
-            # -------------------------------
-            # 1) If bid or ask is unknown, 
-            #    treat as "between bid and ask".
-            # -------------------------------
-            if ask is None or bid is None:
-                color = 'white'
-                # Print the trade in white
-                self.audio_manager.play_between_bid_ask_sound()
-                formatted_amount = format_amount(amount)
-                price_str = smart_format(price) # f"{price:,.4f}"
-                on_color = 'on_grey' if is_big_trade else None
-                attrs = ['bold'] if is_big_trade else []
-                print(colored(
-                    f"{price_str} | ${formatted_amount} |{timestamp_str} | {ticker}",
-                    color=color,
-                    on_color=on_color,
-                    attrs=attrs
-                ))
-                return
-
-            # Otherwise, we have a valid bid/ask
-            # Safe float comparisons with EPSILON
-            if abs(price - ask) < EPSILON:
-                # Price is at ask
-                color = 'green'
-                sound_map = {
-                    False: self.audio_manager.play_buy_sound,
-                    True: self.audio_manager.play_buy_sound_big
-                }
-                sound_map[is_big_trade]()
-
-            elif abs(price - bid) < EPSILON:
-                # Price is at bid
-                color = 'red'
-                sound_map = {
-                    False: self.audio_manager.play_sell_sound,
-                    True: self.audio_manager.play_sell_sound_big
-                }
-                sound_map[is_big_trade]()
-
-            elif price > (ask + EPSILON):
-                # Price is above ask
-                color = 'yellow'
-                sound_map = {
-                    False: self.audio_manager.play_above_ask_sound,
-                    True: self.audio_manager.play_above_ask_sound_big
-                }
-                sound_map[is_big_trade]()
-
-            elif price < (bid - EPSILON):
-                # Price is below bid
-                color = 'magenta'
-                sound_map = {
-                    False: self.audio_manager.play_below_bid_sound,
-                    True: self.audio_manager.play_below_bid_sound_big
-                }
-                sound_map[is_big_trade]()
+        if logging.getLogger().isEnabledFor(logging.INFO):
+            formatted_time = self.convert_timestamp(quote.get('t'))
+            logging.info(f"Quote {ticker} at {formatted_time}: Ask={ask}, Bid={bid}")
 
+    def handle_trade_message(self, trade: dict):
+        """
+        Handle a decoded Polygon trade: {'sym', 'p' (price), 's' (size), 't' (ms), ...}.
+        """
+        ticker = trade['sym']
+        price = trade['p']
+        volume = trade['s']
+        amount = price * volume
+
+        # Skip small trades, before any timestamp or log formatting is done for them
+        if amount < self.trade_threshold:
+            if logging.getLogger().isEnabledFor(logging.DEBUG):
+                logging.debug(f"Trade {ticker} at {self.convert_timestamp(trade.get('t'))} "
+                              f"ignored (Amount: ${amount:.2f})")
+            return
+
+        quote = self.latest_quotes.get(ticker)
+
+        # Decide if the trade is "big" for second threshold
+        is_big_trade = (amount >= self.big_threshold)
+
+        # If bid or ask is unknown, treat as "between bid and ask"
+        if quote is None:
+            code = BETWEEN
+        else:
+            code = classify_trade(price, quote)
+        self._sound_table[code][is_big_trade]()
+
+        # Hand the line to the stdout writer thread
+        prefix, suffix = self._ansi_table[code][is_big_trade]
+        item = (prefix, suffix, price, amount, trade.get('t'), ticker)
+        try:
+            self._out_queue.put_nowait(item)
+        except queue.Full:
+            if is_big_trade:
+                self._out_queue.put(item)
             else:
-                # Price is between bid and ask
-                distance_to_ask = abs(price - ask)
-                distance_to_bid = abs(price - bid)
-                color = 'white'
-
-                # check if price is half-way between bid and ask
-                if abs(distance_to_ask - distance_to_bid) < 1e-9:
-                    self.audio_manager.play_between_bid_ask_sound()
+                self._dropped_lines += 1
+                if self._dropped_lines % 100 == 1:
+                    logging.warning(f"Output queue full; dropped {self._dropped_lines} trades so far")
+
+    def format_trade(self, prefix, suffix, price, amount, ts, ticker):
+        """
+        Build the output line (ANSI prefix/suffix included) for a trade queued by handle_trade_message.
+        """
+        price_str = smart_format(price) # f"{price:,.4f}"
+        return f"{prefix}{price_str} | ${format_amount_cached(amount)} | {self.convert_timestamp(ts)} | {ticker}{suffix}"
+
+    def _stdout_writer_loop(self):
+        """
+        Format the trades queued by handle_trade_message and write them to stdout,
+        one write per drained batch. A terminal gets the encoded batch straight from os.write(),
+        bypassing TextIOWrapper; otherwise it goes through the buffered binary stdout + flush.
+        """
+        out_queue = self._out_queue
+        format_trade = self.format_trade
+        out_fd = sys.stdout.fileno() if sys.stdout.isatty() else None
+        while True:
+            items = [out_queue.get()]
+            while True:
+                try:
+                    items.append(out_queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                data = "".join([format_trade(*item) for item in items]).encode()
+                if out_fd is None:
+                    sys.stdout.buffer.write(data)
+                    sys.stdout.buffer.flush()
                 else:
-                    # Closer to ask
-                    if distance_to_ask < distance_to_bid:
-                        self.audio_manager.play_between_bid_ask_sound_ask()
-                    else:
-                        # closer to bid
-                        self.audio_manager.play_between_bid_ask_sound_bid()
-
-            # Format and print
-            formatted_amount = format_amount(amount)
-            price_str = smart_format(price) # f"{price:,.4f}"
-            on_color = 'on_grey' if is_big_trade else None
-            attrs = ['bold'] if is_big_trade else []
-
-            print(colored(
-                f"{price_str} | ${formatted_amount} | {timestamp_str} | {ticker}",
-                color=color,
-                on_color=on_color,
-                attrs=attrs
-            ))
-        except Exception as e:
-            logging.error(f"Error handling trade message: {e}")
+                    while data:
+                        data = data[os.write(out_fd, data):]
+            except Exception as e:
+                logging.error(f"Error writing trade output: {e}")
+            for _ in items:
+                out_queue.task_done()
+
+    def handle_status_message(self, msg):
+        logging.debug(f"Status: {msg.get('message')}")
 
-    def handle_message(self, msgs):
+    def handle_unexpected_message(self, msg):
+        logging.warning(f"Unexpected message format: {msg}")
+
+    def handle_message(self, frame):
+        """
+        Decode a raw Polygon frame (a JSON array of events) and dispatch each event on its "ev" type.
+        The handlers don't catch their own errors; a failing event is logged here and the rest of
+        the frame is still handled.
+        """
         try:
-            for msg in msgs:
-                if isinstance(msg, EquityTrade):
-                    self.handle_trade_message(msg)
-                elif isinstance(msg, EquityQuote):
-                    self.handle_quote_message(msg)
-                else:
-                    logging.warning(f"Unexpected message format: {msg}")
+            msgs = json_loads(frame)
         except Exception as e:
-            logging.error(f"Error processing message: {e}")
+            logging.error(f"Error decoding message: {e}")
+            return
+        handlers = self._msg_handlers
+        handle_unexpected = self.handle_unexpected_message
+        for msg in msgs:
+            try:
+                handlers.get(msg.get('ev'), handle_unexpected)(msg)
+            except Exception as e:
+                logging.error(f"Error processing message: {e}")
 
     def subscribe_to_symbols(self, symbols):
         for symbol in symbols:
@@ -426,6 +548,8 @@ class TradesProcessor:
                         f"No more retries left. Shutting down gracefully."
                     )
                     break
+        # Let the writer thread print whatever is still queued before the process exits
+        self._out_queue.join()
 
 
 def main():